@@ -1,8 +1,189 @@
 # ai_judge.py
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
 import aiohttp
-import json
+import orjson
 from logger import logger
-from config import AI_MODEL, OLLAMA_BASE_URL
+import database
+from http_session import get_session
+from config import AI_MODEL, CATEGORY_MODELS, COMPONENT_PRICES, OLLAMA_BASE_URL, QUICK_REJECT_PRICES, VERDICT_CACHE_SIZE, VERDICT_TTL
+
+# Static instructions, sent as Ollama's system prompt so they are identical on every request
+SYSTEM_PROMPT = """[ROLE]
+You are a professional PC flipper in Sweden. Your ONLY goal is to identify deals where you can make significant profit after all costs.
+The user message contains one listing: TITLE, PRICE (SEK), SITE and CATEGORY.
+
+[MARKET ANALYSIS REQUIREMENTS]
+1. Check current prices of similar items on Blocket RIGHT NOW (as of September 14, 2025, 12:47 PM CEST)
+2. Compare against recently sold prices for identical/similar items
+3. Consider the specific category context from CATEGORY
+4. Account for market trends - prices are falling for older hardware
+5. Research component-level values for PCs (CPU, GPU, RAM, SSD separately)
+
+[PROFIT ANALYSIS CRITERIA]
+1. ESTIMATE MARKET VALUE: Current selling prices for identical items
+2. CALCULATE POTENTIAL PROFIT: (Market Value - Listing Price - 200kr costs)
+3. PROFIT MARGIN: (Profit / Listing Price) * 100
+4. ABSOLUTE PROFIT: Must meet minimum thresholds
+5. DEMAND FACTOR: High-demand items get priority
+
+[PROFIT THRESHOLDS - VERY STRICT]
+- 🔥 HOT DEAL: 50%+ profit margin AND 1000kr+ absolute profit
+- ✅ GOOD DEAL: 25-50% profit margin AND 500kr+ absolute profit
+- ⚠️ FAIR DEAL: 10-25% profit margin (not worth flipping)
+- ❌ BAD DEAL: <10% profit or loss
+
+[STRICT RULES]
+1. MUST have minimum 500kr absolute profit for GOOD deals
+2. MUST have minimum 1000kr absolute profit for HOT deals
+3. Subtract 200kr for transaction costs, time, and risk
+4. Be EXTREMELY conservative - assume you'll sell at lower end of market range
+5. Only recommend deals with clear, undeniable profit potential
+6. For category scans, be 2x more strict (most items are fairly priced)
+7. Compare to at least 5 similar listings/sold items
+
+[COMPONENT VALUATION GUIDE]
+If the user message has a REFERENCE line, it is the typical used price range for the key component.
+Treat it as a starting point only: verify with current data and adjust for condition, age, specs.
+
+[RESPONSE FORMAT]
+Return ONLY JSON with this structure:
+{
+  "verdict": "HOT DEAL", "GOOD DEAL", "FAIR DEAL", or "BAD DEAL",
+  "reason": "Brief explanation of market comparison and profit potential",
+  "estimated_market_value": estimated resale price in SEK,
+  "estimated_profit": estimated profit in SEK after costs,
+  "profit_percentage": estimated profit percentage,
+  "comparison_count": number of similar listings considered
+}
+
+Be EXTREMELY conservative. Most deals are NOT profitable. When in doubt, say BAD DEAL."""
+
+# LRU cache of recent verdicts, keyed by the same fingerprint as the database's verdict store
+_verdict_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+def _fingerprint(title, price, site, query):
+    """Hash the prompt inputs; titles are normalized so re-posts of the same item (new URL) still hit."""
+    normalized_title = " ".join(str(title).lower().split())
+    raw = f"{normalized_title}|{price}|{site}|{query}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+def _cache_get(key):
+    decision = _verdict_cache.get(key)
+    if decision is None:
+        return None
+    _verdict_cache.move_to_end(key)
+    return dict(decision)
+
+def _cache_put(key, decision):
+    _verdict_cache[key] = dict(decision)
+    _verdict_cache.move_to_end(key)
+    while len(_verdict_cache) > VERDICT_CACHE_SIZE:
+        _verdict_cache.popitem(last=False)
+
+# Matches a fenced ```json block, or else the outermost {...} object in the reply
+_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```|(\{.*\})", re.DOTALL)
+
+# Request bodies are encoded with orjson, so the content type has to be set by hand
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# A streamed generation may run as long as it keeps producing tokens; only a stalled
+# connection (no data for 5 minutes, e.g. a queued request on a busy CPU runner) fails
+OLLAMA_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=300)
+
+# Finds the verdict in a partial streamed reply, once its closing quote has arrived
+_VERDICT_RE = re.compile(r'"verdict"\s*:\s*"([^"]*)"')
+
+def _parse_decision(response_text):
+    """Parse the model's JSON reply; only fall back to regex extraction if it isn't bare JSON."""
+    try:
+        return orjson.loads(response_text)
+    except orjson.JSONDecodeError:
+        match = _JSON_RE.search(response_text)
+        if match is None:
+            raise
+        return orjson.loads(match.group(1) or match.group(2))
+
+# Transaction costs, time and risk subtracted from every flip (SEK)
+TRANSACTION_COST = 200
+
+# Discord's embed field limit; the reason is shown verbatim in deal alerts
+MAX_REASON_LENGTH = 1024
+
+# All component names in one alternation regex. findall() doesn't return overlapping
+# matches, so names are tried longest first ("rtx 3080 ti" before "rtx 3080") and the
+# longest hit wins below
+_COMPONENT_RE = re.compile("|".join(map(re.escape, sorted(COMPONENT_PRICES, key=len, reverse=True))))
+
+def _match_component(title):
+    """Return the most specific COMPONENT_PRICES key mentioned in the title, if any."""
+    return max(_COMPONENT_RE.findall(str(title).lower()), key=len, default=None)
+
+def _bucket(profit, margin):
+    """Map absolute profit (SEK) and margin (%) to a verdict using the prompt's thresholds."""
+    if margin >= 50 and profit >= 1000:
+        return "HOT DEAL"
+    if margin >= 25 and profit >= 500:
+        return "GOOD DEAL"
+    if margin >= 10:
+        return "FAIR DEAL"
+    return "BAD DEAL"
+
+def _apply_profit_math(decision, price):
+    """Recompute profit, margin and verdict from the model's market value instead of trusting its arithmetic."""
+    try:
+        market_value = float(decision.get("estimated_market_value") or 0)
+    except (TypeError, ValueError):
+        return
+    if market_value <= 0 or not price:
+        return
+    profit = market_value - price - TRANSACTION_COST
+    margin = profit / price * 100
+    decision["estimated_profit"] = round(profit)
+    decision["profit_percentage"] = round(margin, 1)
+    decision["verdict"] = _bucket(profit, margin)
+
+def _bad_verdict(reason):
+    """Build a BAD DEAL verdict with zeroed numbers."""
+    return {
+        "verdict": "BAD DEAL",
+        "reason": reason,
+        "estimated_market_value": 0,
+        "estimated_profit": 0,
+        "profit_percentage": 0,
+        "comparison_count": 0
+    }
+
+def _failed_verdict(reason):
+    """BAD DEAL for a call that produced no verdict; marked failed so the listing isn't recorded as judged."""
+    decision = _bad_verdict(reason)
+    decision["failed"] = True
+    return decision
+
+# Words that mark a complete computer rather than a bare component
+_WHOLE_SYSTEM_RE = re.compile(r"dator|\bpc\b|computer|workstation|server|stationär")
+
+def quick_reject(listing):
+    """Cheap rule-based pre-filter. Returns a BAD DEAL verdict, or None if the AI should decide."""
+    category = listing.get('category')
+    max_price = QUICK_REJECT_PRICES.get(category)
+    if max_price is None:
+        return None
+
+    # The ceilings are used prices for the bare component, so only apply them when the title
+    # names a component and nothing suggests a whole PC or workstation built around it
+    title = str(listing.get('title', '')).lower()
+    component = _match_component(title)
+    if component is None or _WHOLE_SYSTEM_RE.search(title):
+        return None
+
+    max_price = max(max_price, COMPONENT_PRICES[component][1])
+    price = listing.get('price', 0)
+    if price <= max_price:
+        return None
+    return _bad_verdict(f"Price {price} SEK is above the {max_price} SEK resale ceiling for {category}")
 
 async def analyze_listing(listing):
     """Analyzes listings for profit potential with market comparison - VERY strict."""
@@ -11,116 +192,99 @@ async def analyze_listing(listing):
     price = listing.get('price', 0)
     site = listing.get('site', listing.get('source', 'unknown'))
     query = listing.get('query', 'unknown category')
-    
-    prompt = f"""
-    [ROLE]
-    You are a professional PC flipper in Sweden. Your ONLY goal is to identify deals where you can make significant profit after all costs.
-
-    [LISTING DATA]
-    TITLE: {title}
-    PRICE: {price} SEK
-    SITE: {site}
-    CATEGORY: {query}
-
-    [MARKET ANALYSIS REQUIREMENTS]
-    1. Check current prices of similar items on Blocket RIGHT NOW (as of September 14, 2025, 12:47 PM CEST)
-    2. Compare against recently sold prices for identical/similar items
-    3. Consider the specific category context from {query}
-    4. Account for market trends - prices are falling for older hardware
-    5. Research component-level values for PCs (CPU, GPU, RAM, SSD separately)
-
-    [PROFIT ANALYSIS CRITERIA]
-    1. ESTIMATE MARKET VALUE: Current selling prices for identical items
-    2. CALCULATE POTENTIAL PROFIT: (Market Value - Listing Price - 200kr costs)
-    3. PROFIT MARGIN: (Profit / Listing Price) * 100
-    4. ABSOLUTE PROFIT: Must meet minimum thresholds
-    5. DEMAND FACTOR: High-demand items get priority
-
-    [PROFIT THRESHOLDS - VERY STRICT]
-    - 🔥 HOT DEAL: 50%+ profit margin AND 1000kr+ absolute profit
-    - ✅ GOOD DEAL: 25-50% profit margin AND 500kr+ absolute profit  
-    - ⚠️ FAIR DEAL: 10-25% profit margin (not worth flipping)
-    - ❌ BAD DEAL: <10% profit or loss
-
-    [STRICT RULES]
-    1. MUST have minimum 500kr absolute profit for GOOD deals
-    2. MUST have minimum 1000kr absolute profit for HOT deals
-    3. Subtract 200kr for transaction costs, time, and risk
-    4. Be EXTREMELY conservative - assume you'll sell at lower end of market range
-    5. Only recommend deals with clear, undeniable profit potential
-    6. For category scans, be 2x more strict (most items are fairly priced)
-    7. Compare to at least 5 similar listings/sold items
-
-    [COMPONENT VALUATION GUIDE - REFERENCE ONLY, VERIFY WITH CURRENT DATA]
-    - RTX 3080: Check current Blocket, typically 3000-5000kr for used
-    - Xeon CPUs: Verify market, usually 2000-4000kr depending on gen
-    - Adjust for condition, age, specs
-
-    [RESPONSE FORMAT]
-    Return ONLY JSON with this structure:
-    {{
-      "verdict": "HOT DEAL", "GOOD DEAL", "FAIR DEAL", or "BAD DEAL",
-      "reason": "Brief explanation of market comparison and profit potential",
-      "estimated_market_value": estimated resale price in SEK,
-      "estimated_profit": estimated profit in SEK after costs,
-      "profit_percentage": estimated profit percentage,
-      "comparison_count": number of similar listings considered
-    }}
-
-    Be EXTREMELY conservative. Most deals are NOT profitable. When in doubt, say BAD DEAL.
-    """
+
+    # Skip the LLM entirely for listings that can never clear the profit thresholds
+    rejected = quick_reject(listing)
+    if rejected is not None:
+        logger.debug(f"Quick reject for {title}: {rejected['reason']}")
+        return rejected
+
+    # Skip the LLM entirely if we judged the same listing recently
+    fingerprint = _fingerprint(title, price, site, query)
+    cached = _cache_get(fingerprint)
+    if cached is not None:
+        logger.debug(f"Verdict cache hit for {title}")
+        return cached
+
+    # Then the database, for listings judged on an earlier run
+    stored = await asyncio.to_thread(database.get_verdict, fingerprint, VERDICT_TTL)
+    if stored is not None:
+        logger.debug(f"Stored verdict hit for {title}")
+        _cache_put(fingerprint, stored)
+        return stored
+
+    # Only the listing fields vary per call; the instructions go in the system prompt
+    user_prompt = f"TITLE: {title}\nPRICE: {price} SEK\nSITE: {site}\nCATEGORY: {query}"
+    component = _match_component(title)
+    if component is not None:
+        low, high = COMPONENT_PRICES[component]
+        user_prompt += f"\nREFERENCE: {component} typically {low}-{high} SEK used"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            payload = {
-                "model": AI_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json",
-                "options": {
-                    "temperature": 0.1,  # More deterministic
-                    "top_p": 0.9
-                }
+        session = await get_session()
+        payload = {
+            "model": CATEGORY_MODELS.get(listing.get('category'), AI_MODEL),
+            "system": SYSTEM_PROMPT,
+            "prompt": user_prompt,
+            "stream": True,
+            "format": "json",
+            "options": {
+                "temperature": 0.1,  # More deterministic
+                "top_p": 0.9
             }
-            async with session.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload) as resp:
-                result = await resp.json()
-                response_text = result.get('response', '{"verdict": "BAD DEAL", "reason": "AI failed to respond", "estimated_market_value": 0, "estimated_profit": 0, "profit_percentage": 0, "comparison_count": 0}')
-                
-                # Clean response
-                response_text = response_text.strip()
-                if '```json' in response_text:
-                    response_text = response_text.split('```json')[1].split('```')[0].strip()
-                elif '```' in response_text:
-                    response_text = response_text.split('```')[1].split('```')[0].strip()
-                
-                # Parse JSON
-                decision = json.loads(response_text)
-                
-                # Validate fields
-                required_fields = ["verdict", "reason", "estimated_market_value", "estimated_profit", "profit_percentage", "comparison_count"]
-                for field in required_fields:
-                    if field not in decision:
-                        decision[field] = 0 if field != "reason" else "Missing field in AI response"
-                
-                return decision
-                
-    except json.JSONDecodeError as e:
-        logger.error(f"AI JSON decode error: {e}")
-        return {
-            "verdict": "BAD DEAL", 
-            "reason": "AI returned invalid JSON format", 
-            "estimated_market_value": 0, 
-            "estimated_profit": 0, 
-            "profit_percentage": 0,
-            "comparison_count": 0
         }
+        async with session.post(f"{OLLAMA_BASE_URL}/api/generate", data=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=OLLAMA_TIMEOUT) as resp:
+            # Failed calls (unknown model, OOM, ...) get a failed verdict that is neither cached
+            # nor stored, and main() doesn't mark the listing seen, so it is judged again next run
+            if resp.status != 200:
+                logger.error(f"Ollama returned HTTP {resp.status}: {(await resp.text())[:200]}")
+                return _failed_verdict("AI failed to respond")
+
+            # Read the reply as it streams so a BAD DEAL verdict can stop generation early
+            response_text = ""
+            verdict_seen = False
+            async for line in resp.content:
+                if not line.strip():
+                    continue
+                chunk = orjson.loads(line)
+                if chunk.get('error'):
+                    logger.error(f"Ollama error: {chunk['error']}")
+                    return _failed_verdict("AI failed to respond")
+                response_text += chunk.get('response', '')
+                if not verdict_seen:
+                    match = _VERDICT_RE.search(response_text)
+                    if match:
+                        verdict_seen = True
+                        if match.group(1) == "BAD DEAL":
+                            resp.close()
+                            decision = _bad_verdict("AI judged it a bad deal (generation stopped early)")
+                            _cache_put(fingerprint, decision)
+                            await asyncio.to_thread(database.put_verdict, fingerprint, decision)
+                            return decision
+                if chunk.get('done'):
+                    break
+            if not response_text:
+                logger.error(f"Ollama sent an empty reply for {title}")
+                return _failed_verdict("AI failed to respond")
+            
+            # Parse JSON
+            decision = _parse_decision(response_text)
+            
+            # Validate fields
+            required_fields = ["verdict", "reason", "estimated_market_value", "estimated_profit", "profit_percentage", "comparison_count"]
+            for field in required_fields:
+                if field not in decision:
+                    decision[field] = 0 if field != "reason" else "Missing field in AI response"
+
+            decision["reason"] = str(decision["reason"])[:MAX_REASON_LENGTH]
+            _apply_profit_math(decision, price)
+            _cache_put(fingerprint, decision)
+            await asyncio.to_thread(database.put_verdict, fingerprint, decision)
+            return decision
+            
+    except orjson.JSONDecodeError as e:
+        logger.error(f"AI JSON decode error: {e}")
+        return _failed_verdict("AI returned invalid JSON format")
     except Exception as e:
         logger.error(f"AI analysis error: {e}")
-        return {
-            "verdict": "BAD DEAL", 
-            "reason": "Error during analysis", 
-            "estimated_market_value": 0, 
-            "estimated_profit": 0, 
-            "profit_percentage": 0,
-            "comparison_count": 0
-        }
+        return _failed_verdict("Error during analysis")
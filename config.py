@@ -1,19 +1,51 @@
 # config.py
 import os
 
+__all__ = [
+    "DISCORD_WEBHOOK_URL", "DISCORD_BATCH_WINDOW",
+    "OLLAMA_BASE_URL", "AI_MODEL", "CATEGORY_MODELS", "MAX_CONCURRENT_LLM", "LISTING_QUEUE_SIZE", "VERDICT_CACHE_SIZE", "VERDICT_TTL",
+    "MAX_PAGES_TO_SCRAPE", "MAX_CONCURRENT_SEARCHES", "MAX_CONCURRENT_PAGES", "POLL_INTERVAL", "HTTP_FAST_PATH", "REQUEST_DELAY", "PAGE_JITTER_MS", "SCRAPE_TIMEOUT", "ENABLE_SCREENSHOTS", "LOG_LEVEL",
+    "PRICE_THRESHOLDS", "QUICK_REJECT_PRICES", "COMPONENT_PRICES",
+    "DATABASE_PATH", "RESET_DATABASE", "LOG_FILE", "SCREENSHOT_DIR",
+]
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer override from the environment, falling back to the default."""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean override (1/true/yes) from the environment."""
+    value = os.getenv(name)
+    return value.strip().lower() in ("1", "true", "yes") if value else default
+
 # Discord Webhook
 DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL', '')
+DISCORD_BATCH_WINDOW = 5  # Seconds a deal waits for others to share its webhook message
 
 # AI Settings
-OLLAMA_BASE_URL = "http://localhost:11434"
-AI_MODEL = "mistral:7b"
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', "http://localhost:11434")
+AI_MODEL = os.getenv('AI_MODEL', "mistral:7b")
+# Cheaper models for high-volume categories where most listings are fairly priced
+CATEGORY_MODELS = {
+    "stationary_computers": os.getenv('SMALL_AI_MODEL', "qwen2:0.5b")
+}
+MAX_CONCURRENT_LLM = _env_int('MAX_CONCURRENT_LLM', 4)  # Parallel requests to Ollama (match OLLAMA_NUM_PARALLEL)
+LISTING_QUEUE_SIZE = 64  # Scraped listings waiting for the AI before scrapers pause
+VERDICT_CACHE_SIZE = 10000  # Max AI verdicts kept in memory for repeat listings
+VERDICT_TTL = 7 * 24 * 3600  # Seconds a stored AI verdict stays valid across runs
 
 # Scraping settings
-MAX_PAGES_TO_SCRAPE = 3
-REQUEST_DELAY = 5  # Increased delay for safety
+MAX_PAGES_TO_SCRAPE = _env_int('MAX_PAGES_TO_SCRAPE', 3)
+MAX_CONCURRENT_SEARCHES = _env_int('MAX_CONCURRENT_SEARCHES', 2)  # Searches (browsers) running at once
+MAX_CONCURRENT_PAGES = _env_int('MAX_CONCURRENT_PAGES', 3)  # Result pages per search fetched at once after page 1
+POLL_INTERVAL = _env_int('POLL_INTERVAL', 0)  # Seconds between scans in a long-running process; 0 scans once and exits
+HTTP_FAST_PATH = _env_bool('HTTP_FAST_PATH', True)  # Try plain HTTP GETs before starting a browser for a search
+REQUEST_DELAY = _env_int('REQUEST_DELAY', 5)  # Pause after page 1 before fetching the rest; increased for safety
+PAGE_JITTER_MS = _env_int('PAGE_JITTER_MS', 1500)  # Max random pause (ms) on a browser page once its listings have rendered
 SCRAPE_TIMEOUT = 60000  # Increased to 60s to handle slow loads in Actions
-ENABLE_SCREENSHOTS = True  # Enable screenshot capture
-LOG_LEVEL = "DEBUG"  # DEBUG, INFO, WARNING, ERROR
+ENABLE_SCREENSHOTS = _env_bool('ENABLE_SCREENSHOTS', True)  # Enable screenshot capture
+LOG_LEVEL = os.getenv('LOG_LEVEL', "DEBUG").upper()  # DEBUG, INFO, WARNING, ERROR
 
 # Profitability thresholds (in SEK)
 PRICE_THRESHOLDS = {
@@ -22,14 +54,22 @@ PRICE_THRESHOLDS = {
     "xeon_workstation": 5000
 }
 
-# Keywords for filtering
-KEYWORDS = {
-    "rtx_3080": ["rtx 3080", "3080", "gaming", "dator", "computer"],
-    "stationary_computers": ["dator", "computer", "pc", "stationär"],
-    "xeon_workstation": ["xeon", "workstation", "server", "workstation"]
+# Bare components (no whole computer in the title) priced above these (in SEK) are rejected
+# without asking the AI, based on the upper end of the used market for the component
+QUICK_REJECT_PRICES = {
+    "rtx_3080": 5000,
+    "xeon_workstation": 4000
+}
+
+# Typical used-market price ranges (in SEK) for key components, as (low, high)
+COMPONENT_PRICES = {
+    "rtx 3080 ti": (4500, 6000),
+    "rtx 3080": (3000, 5000),
+    "xeon": (2000, 4000)
 }
 
 # Database path
-DATABASE_PATH = "listings.db"
+DATABASE_PATH = os.getenv('DATABASE_PATH', "listings.db")
+RESET_DATABASE = _env_bool('DEAL_SNIPER_RESET_DB', False)  # Wipe the database on startup
 LOG_FILE = "scraper.log"
 SCREENSHOT_DIR = "screenshots"
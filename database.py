@@ -1,15 +1,75 @@
 # database.py
+import functools
+import hashlib
+import json
+import math
+import os
 import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
 from config import DATABASE_PATH
 from datetime import datetime
 
-def init_database():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+# One shared connection for the whole process; sqlite3 connections aren't reentrant, so guard it
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.RLock()
+
+class _BloomFilter:
+    """Fixed-size Bloom filter over listing ids: no false negatives, rare false positives."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: derive every bit position from one 128-bit digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+# In-memory filter of seen ids so the common "not seen yet" answer never touches SQLite
+SEEN_FILTER_CAPACITY = 100_000
+SEEN_FILTER_ERROR_RATE = 0.001
+_seen_filter = _BloomFilter(SEEN_FILTER_CAPACITY, SEEN_FILTER_ERROR_RATE)
+
+def _get_connection() -> sqlite3.Connection:
+    """Return the shared connection, opening it (in WAL mode) on first use."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA temp_store=MEMORY")
+        _conn.execute("PRAGMA cache_size=-64000")  # ~64 MB page cache (negative = KiB)
+    return _conn
+
+def close_database():
+    """Close the shared connection (it is reopened on next use)."""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+        ensure_schema.cache_clear()
+
+def _migrate_seen_listings(conn: sqlite3.Connection):
+    """v1: seen_listings with source/timestamp columns, converting the old sqlite_utils table if present"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(seen_listings)")}
+    legacy = bool(columns) and "source" not in columns
+    if legacy:
+        conn.execute("ALTER TABLE seen_listings RENAME TO seen_listings_legacy")
     
-    # Create table for seen listings
-    cursor.execute('''
+    conn.execute('''
     CREATE TABLE IF NOT EXISTS seen_listings (
         id TEXT PRIMARY KEY,
         title TEXT,
@@ -20,51 +80,169 @@ def init_database():
     )
     ''')
     
-    conn.commit()
-    conn.close()
-    print("✅ Database table 'seen_listings' ready")
+    if legacy:
+        # Old rows had site/created (ISO text with a 'T'); keep them so they stay deduplicated
+        conn.execute('''
+        INSERT OR IGNORE INTO seen_listings (id, title, price, url, source, timestamp)
+        SELECT id, title, CAST(price AS INTEGER), url, site,
+               COALESCE(replace(substr(created, 1, 19), 'T', ' '), CURRENT_TIMESTAMP)
+        FROM seen_listings_legacy
+        ''')
+        conn.execute("DROP TABLE seen_listings_legacy")
+    
+    # Index for cleanup_old_listings
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_listings_timestamp ON seen_listings (timestamp)")
 
-def is_listing_seen(listing_id: str) -> bool:
-    """Check if a listing has already been processed"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def _migrate_verdicts(conn: sqlite3.Connection):
+    """v2: AI verdicts keyed by listing fingerprint, so unchanged listings aren't re-judged on later runs"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS verdicts (
+        key TEXT PRIMARY KEY,
+        json TEXT,
+        ts INTEGER
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_ts ON verdicts (ts)")
+
+# Applied in order; PRAGMA user_version records how many have run. Only ever append.
+_MIGRATIONS = [_migrate_seen_listings, _migrate_verdicts]
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+@functools.cache
+def ensure_schema():
+    """Bring the database up to SCHEMA_VERSION once per process; later calls are a cache lookup"""
+    global _seen_filter
+    with _lock:
+        conn = _get_connection()
+        
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            conn.execute("BEGIN")
+            try:
+                for migrate in _MIGRATIONS[version:]:
+                    migrate(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"✅ Database migrated from schema v{version} to v{SCHEMA_VERSION}")
     
-    cursor.execute("SELECT id FROM seen_listings WHERE id = ?", (listing_id,))
-    result = cursor.fetchone()
+        # Load every known id into the Bloom filter
+        _seen_filter = _BloomFilter(SEEN_FILTER_CAPACITY, SEEN_FILTER_ERROR_RATE)
+        for (listing_id,) in conn.execute("SELECT id FROM seen_listings"):
+            _seen_filter.add(str(listing_id))
     
-    conn.close()
+    print("✅ Database tables 'seen_listings' and 'verdicts' ready")
+
+def reset_database():
+    """Delete the database file (and its WAL files) so the next run starts empty"""
+    close_database()
+    for path in (DATABASE_PATH, f"{DATABASE_PATH}-wal", f"{DATABASE_PATH}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    print("🧹 Removed database for a fresh start")
+
+def is_listing_seen(listing_id: str) -> bool:
+    """Check if a listing has already been processed"""
+    if listing_id not in _seen_filter:
+        return False
+    try:
+        with _lock:
+            result = _get_connection().execute("SELECT 1 FROM seen_listings WHERE id = ?", (listing_id,)).fetchone()
+    except sqlite3.OperationalError as e:
+        # Fail closed: treating every listing as new would send all of them to the AI again
+        print(f"⚠️ Seen-check failed for {listing_id}, treating it as seen: {e}")
+        return True
     return result is not None
 
+# SQLite's default limit on bound parameters per statement
+_MAX_SQL_PARAMS = 999
+
+def filter_unseen(listing_ids: List[str]) -> List[str]:
+    """Return the ids that have not been processed yet, with at most one query per 999 ids"""
+    # Only ids the Bloom filter flags can have been seen; the rest are new for sure
+    maybe_seen = [listing_id for listing_id in listing_ids if listing_id in _seen_filter]
+    if not maybe_seen:
+        return list(listing_ids)
+    seen = set()
+    try:
+        with _lock:
+            conn = _get_connection()
+            for i in range(0, len(maybe_seen), _MAX_SQL_PARAMS):
+                chunk = maybe_seen[i:i + _MAX_SQL_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                seen.update(row[0] for row in conn.execute(f"SELECT id FROM seen_listings WHERE id IN ({placeholders})", chunk))
+    except sqlite3.OperationalError as e:
+        # Fail closed, as in is_listing_seen
+        print(f"⚠️ Seen-check failed for {len(maybe_seen)} listings, treating them as seen: {e}")
+        seen.update(maybe_seen)
+    return [listing_id for listing_id in listing_ids if listing_id not in seen]
+
 def mark_listing_seen(listing_id: str, title: str = "", price: int = 0, url: str = "", source: str = "blocket"):
     """Mark a listing as seen/processed"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
+    mark_listings_seen([(listing_id, title, price, url, source)])
+
+def mark_listings_seen(rows: List[Tuple[str, str, int, str, str]]):
+    """Mark many listings as seen in a single transaction; rows are (id, title, price, url, source)"""
+    if not rows:
+        return
     try:
-        cursor.execute('''
-        INSERT OR IGNORE INTO seen_listings (id, title, price, url, source)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (listing_id, title, price, url, source))
-        
-        conn.commit()
+        with _lock:
+            conn = _get_connection()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany('''
+                INSERT OR IGNORE INTO seen_listings (id, title, price, url, source)
+                VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            for row in rows:
+                _seen_filter.add(row[0])
     except Exception as e:
-        print(f"Error marking listing as seen: {e}")
-    finally:
-        conn.close()
+        print(f"Error marking listings as seen: {e}")
+
+def get_verdict(key: str, ttl: int) -> Optional[dict]:
+    """Return the stored verdict for key if it is younger than ttl seconds"""
+    try:
+        with _lock:
+            row = _get_connection().execute("SELECT json FROM verdicts WHERE key = ? AND ts >= ?", (key, int(time.time()) - ttl)).fetchone()
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Verdict lookup failed for {key}: {e}")
+        return None
+    return json.loads(row[0]) if row else None
+
+def put_verdict(key: str, verdict: dict):
+    """Store (or refresh) the verdict for key"""
+    try:
+        with _lock:
+            _get_connection().execute(
+                "INSERT OR REPLACE INTO verdicts (key, json, ts) VALUES (?, ?, ?)",
+                (key, json.dumps(verdict), int(time.time()))
+            )
+    except Exception as e:
+        print(f"Error storing verdict: {e}")
+
+def cleanup_old_verdicts(ttl: int):
+    """Remove verdicts older than ttl seconds"""
+    with _lock:
+        cursor = _get_connection().execute("DELETE FROM verdicts WHERE ts < ?", (int(time.time()) - ttl,))
+        deleted_count = cursor.rowcount
+    
+    print(f"🧹 Cleaned up {deleted_count} expired verdicts")
+    return deleted_count
 
 def cleanup_old_listings(days: int = 30):
     """Remove old listings from the database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM seen_listings WHERE timestamp < datetime('now', ?)", (f'-{days} days',))
-    deleted_count = cursor.rowcount
-    
-    conn.commit()
-    conn.close()
+    with _lock:
+        cursor = _get_connection().execute("DELETE FROM seen_listings WHERE timestamp < datetime('now', ?)", (f'-{days} days',))
+        deleted_count = cursor.rowcount
     
     print(f"🧹 Cleaned up {deleted_count} old listings")
     return deleted_count
 
-# Initialize database when module is imported
-init_database()
+if __name__ == "__main__":
+    ensure_schema()
@@ -1,47 +1,152 @@
 # discord_webhook.py - REPLACES discord_bot.py
+import asyncio
+from collections import deque
 import aiohttp
-import json
+import orjson
 from config import DISCORD_WEBHOOK_URL
+from http_session import get_session
 
-async def send_deal_alert(listing, ai_verdict, deal_type):
-    """Sends deal alerts using Discord webhooks instead of bot."""
+# Webhook posts share the pooled session but must not hang the run
+WEBHOOK_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Payloads are encoded with orjson, so the content type has to be set by hand
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Retries after a 429 before giving up on a message
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Discord allows about 30 messages per minute per webhook, on top of the per-request bucket
+WEBHOOK_MESSAGES_PER_WINDOW = 30
+WEBHOOK_WINDOW_SECONDS = 60
+
+# Per-webhook event-loop time before which the bucket is known to be empty
+_next_ok = {}
+
+# Per-webhook send times within the last window
+_sent_times = {}
+
+def _update_rate_limit(url, headers):
+    """Remember when an exhausted bucket refills, from Discord's rate-limit headers."""
     try:
-        # Different colors for different deal types
-        color = 0x00FF00 if deal_type == "HOT" else 0x0099FF  # Green for HOT, Blue for GOOD
-        emoji = "🔥" if deal_type == "HOT" else "✅"
-        
-        # Create embed message
-        embed = {
-            "title": f"{emoji} {deal_type} DEAL ALERT! {emoji}",
-            "description": f"[{listing['title']}]({listing['url']})",
-            "color": color,
-            "fields": [
-                {"name": "💰 Purchase Price", "value": f"{listing['price']} SEK", "inline": True},
-                {"name": "🌐 Site", "value": listing['site'].capitalize(), "inline": True},
-                {"name": "📈 Estimated Profit", "value": f"{ai_verdict['estimated_profit']} SEK ({ai_verdict['profit_percentage']}%)", "inline": True},
-                {"name": "🔍 Query", "value": listing['query'], "inline": True},
-                {"name": "🤖 AI Analysis", "value": ai_verdict['reason'], "inline": False},
-                {"name": "📈 Market Value", "value": f"{ai_verdict['estimated_market_value']} SEK", "inline": True},
-                {"name": "💰 Potential Profit", "value": f"{ai_verdict['estimated_profit']} SEK ({ai_verdict['profit_percentage']}%)", "inline": True},
-                {"name": "🔍 Comparisons", "value": f"Based on {ai_verdict['comparison_count']} similar listings", "inline": True}
-            ],
-            "footer": {"text": "DealSniper AI • Flip wisely!"},
-            "timestamp": None
-        }
+        remaining = int(headers.get('X-RateLimit-Remaining', 1))
+        reset_after = float(headers.get('X-RateLimit-Reset-After', 0))
+    except ValueError:
+        return
+    if remaining == 0:
+        _next_ok[url] = asyncio.get_running_loop().time() + reset_after
+
+async def _acquire_slot(url):
+    """Wait until both the header bucket and the per-minute window allow another message."""
+    loop = asyncio.get_running_loop()
+    window = _sent_times.setdefault(url, deque())
+    while True:
+        now = loop.time()
+        while window and window[0] <= now - WEBHOOK_WINDOW_SECONDS:
+            window.popleft()
+        wait = _next_ok.get(url, 0) - now
+        if len(window) >= WEBHOOK_MESSAGES_PER_WINDOW:
+            wait = max(wait, window[0] + WEBHOOK_WINDOW_SECONDS - now)
+        if wait <= 0:
+            # Claim the slot before yielding so concurrent senders can't take it too
+            window.append(now)
+            return
+        await asyncio.sleep(wait)
+
+async def _post(payload, url=DISCORD_WEBHOOK_URL):
+    """POST a payload to the webhook, waiting out Discord's rate limits. Returns the final status."""
+    session = await get_session()
+    body = orjson.dumps(payload)  # Encoded once, even if the post has to be retried
+    delay = 1.0
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await _acquire_slot(url)
+        async with session.post(url, data=body, headers=_JSON_HEADERS, timeout=WEBHOOK_TIMEOUT) as response:
+            _update_rate_limit(url, response.headers)
+            if response.status != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response.status
+            retry_after = float(response.headers.get('Retry-After', delay))
+        print(f"⏳ Rate limited by Discord, retrying in {max(retry_after, delay):.1f}s")
+        await asyncio.sleep(max(retry_after, delay))
+        delay *= 2
+
+# Discord caps a single webhook message at 10 embeds and 6000 characters of embed text
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# Discord's embed description limit; the description is the linked listing title
+MAX_DESCRIPTION_LENGTH = 4096
+
+# Per deal type styling: Green for HOT, Blue for GOOD
+_DEAL_STYLES = {
+    "HOT": {"color": 0x00FF00, "title": "🔥 HOT DEAL ALERT! 🔥"},
+    "GOOD": {"color": 0x0099FF, "title": "✅ GOOD DEAL ALERT! ✅"},
+}
+_DEAL_FOOTER = {"text": "DealSniper AI • Flip wisely!"}
+
+# (name, value template, inline) for each deal field, filled from the listing and verdict
+_DEAL_FIELDS = (
+    ("💰 Purchase Price", "{price} SEK", True),
+    ("🌐 Site", "{site_name}", True),
+    ("📈 Estimated Profit", "{estimated_profit} SEK ({profit_percentage}%)", True),
+    ("🔍 Query", "{query}", True),
+    ("🤖 AI Analysis", "{reason}", False),
+    ("📈 Market Value", "{estimated_market_value} SEK", True),
+    ("🔍 Comparisons", "Based on {comparison_count} similar listings", True),
+)
+
+def build_embed(listing, ai_verdict, deal_type):
+    """Build the Discord embed for one deal alert."""
+    style = _DEAL_STYLES.get(deal_type, _DEAL_STYLES["GOOD"])
+    values = {**listing, **ai_verdict, "site_name": listing['site'].capitalize()}
+    # Cap the title so the whole markdown link fits in the description
+    title = listing['title'][:MAX_DESCRIPTION_LENGTH - len(listing['url']) - 4]
+    
+    return {
+        "title": style["title"],
+        "url": listing['url'],
+        "description": f"[{title}]({listing['url']})",
+        "color": style["color"],
+        "fields": [
+            {"name": name, "value": template.format_map(values), "inline": inline}
+            for name, template, inline in _DEAL_FIELDS
+        ],
+        "footer": _DEAL_FOOTER
+    }
 
-        async with aiohttp.ClientSession() as session:
-            payload = {"embeds": [embed]}
-            async with session.post(DISCORD_WEBHOOK_URL, json=payload) as response:
-                if response.status == 204:
-                    print(f"✅ {deal_type} deal alert sent via webhook!")
-                    return True
-                else:
-                    print(f"❌ Webhook failed: {response.status}")
-                    return False
+def _embed_chars(embed):
+    """Count the characters Discord charges against the per-message embed budget."""
+    text = [embed.get("title", ""), embed.get("description", ""), embed.get("footer", {}).get("text", "")]
+    for field in embed.get("fields", []):
+        text += [field["name"], field["value"]]
+    return sum(len(str(part)) for part in text)
+
+def _batch_embeds(embeds):
+    """Split embeds into groups that each fit in one webhook message."""
+    batch, batch_chars = [], 0
+    for embed in embeds:
+        chars = _embed_chars(embed)
+        if batch and (len(batch) == MAX_EMBEDS_PER_MESSAGE or batch_chars + chars > MAX_EMBED_CHARS_PER_MESSAGE):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(embed)
+        batch_chars += chars
+    if batch:
+        yield batch
+
+async def send_deal_alerts(deals):
+    """Send (listing, ai_verdict, deal_type) alerts, packing several embeds into each webhook message."""
+    sent = 0
+    try:
+        for batch in _batch_embeds([build_embed(*deal) for deal in deals]):
+            status = await _post({"embeds": batch})
+            if status == 204:
+                sent += len(batch)
+                print(f"✅ {len(batch)} deal alert(s) sent via webhook!")
+            else:
+                print(f"❌ Webhook failed: {status}")
                     
     except Exception as e:
         print(f"❌ Failed to send webhook alert: {e}")
-        return False
+    return sent
 
 async def send_startup_message():
     """Send a startup message to Discord."""
@@ -53,16 +158,14 @@ async def send_startup_message():
             "footer": {"text": "DealSniper AI • Monitoring for profitable deals"}
         }
 
-        async with aiohttp.ClientSession() as session:
-            payload = {"embeds": [embed]}
-            async with session.post(DISCORD_WEBHOOK_URL, json=payload) as response:
-                if response.status == 204:
-                    print("✅ Startup message sent via webhook!")
-                    return True
-                else:
-                    print(f"❌ Startup webhook failed: {response.status}")
-                    return False
-                    
+        status = await _post({"embeds": [embed]})
+        if status == 204:
+            print("✅ Startup message sent via webhook!")
+            return True
+        else:
+            print(f"❌ Startup webhook failed: {status}")
+            return False
+
     except Exception as e:
         print(f"❌ Failed to send startup alert: {e}")
         return False
@@ -84,16 +187,28 @@ async def send_summary_message(total_listings, hot_deals, good_deals):
             "footer": {"text": "DealSniper AI • Scan completed"}
         }
 
-        async with aiohttp.ClientSession() as session:
-            payload = {"embeds": [embed]}
-            async with session.post(DISCORD_WEBHOOK_URL, json=payload) as response:
-                if response.status == 204:
-                    print("✅ Summary message sent via webhook!")
-                    return True
-                else:
-                    print(f"❌ Summary webhook failed: {response.status}")
-                    return False
-                    
+        status = await _post({"embeds": [embed]})
+        if status == 204:
+            print("✅ Summary message sent via webhook!")
+            return True
+        else:
+            print(f"❌ Summary webhook failed: {status}")
+            return False
+
     except Exception as e:
         print(f"❌ Failed to send summary alert: {e}")
         return False
+
+# Without a webhook URL there is nothing to post to: swap every sender for a no-op once,
+# rather than failing a request per message
+if not DISCORD_WEBHOOK_URL:
+    print("⚠️ DISCORD_WEBHOOK_URL is not set; Discord messages are disabled")
+
+    async def send_deal_alerts(deals):
+        return 0
+
+    async def send_startup_message():
+        return False
+
+    async def send_summary_message(total_listings, hot_deals, good_deals):
+        return False
\ No newline at end of file
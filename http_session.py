@@ -0,0 +1,30 @@
+# http_session.py
+import aiohttp
+from typing import Optional
+
+# One pooled HTTP session shared by every outbound call (Blocket, Ollama, Discord)
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        # Per-call timeouts are set by the callers: Ollama generations can legitimately
+        # take minutes, so the session's default 5-minute total timeout is switched off
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None),
+            connector=aiohttp.TCPConnector(
+                limit=32,
+                limit_per_host=8,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+            )
+        )
+    return _session
+
+async def close_session():
+    """Close the shared aiohttp session (call once on shutdown)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
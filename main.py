@@ -1,12 +1,11 @@
 # main.py
 import asyncio
-import os
-import aiohttp
-from typing import List, Dict
-from logger import logger, setup_logger, log_github_actions_info
+import signal
+from logger import logger, log_github_actions_info
+from http_session import close_session
 import scraper
 import database
-from config import DISCORD_WEBHOOK_URL, SCREENSHOT_DIR, PRICE_THRESHOLDS, KEYWORDS
+from config import DISCORD_BATCH_WINDOW, DISCORD_WEBHOOK_URL, LISTING_QUEUE_SIZE, MAX_CONCURRENT_LLM, MAX_CONCURRENT_SEARCHES, POLL_INTERVAL, RESET_DATABASE, PRICE_THRESHOLDS, VERDICT_TTL
 try:
     from ai_judge import analyze_listing  # Explicitly import the function
 except ImportError as e:
@@ -15,13 +14,14 @@ except ImportError as e:
 
 # Import the webhook functions
 try:
-    from discord_webhook import send_deal_alert, send_startup_message, send_summary_message
+    from discord_webhook import send_deal_alerts, send_startup_message, send_summary_message
 except ImportError:
     logger.warning("Discord webhook module not found, using fallback")
     # Fallback implementation if webhook module is not available
-    async def send_deal_alert(listing, ai_verdict, deal_type):
-        logger.info(f"Would send {deal_type} deal alert: {listing['title']}")
-        return True
+    async def send_deal_alerts(deals):
+        for listing, ai_verdict, deal_type in deals:
+            logger.info(f"Would send {deal_type} deal alert: {listing['title']}")
+        return len(deals)
         
     async def send_startup_message():
         logger.info("Bot started up")
@@ -31,83 +31,182 @@ except ImportError:
         logger.info(f"Scan complete: {total_listings} listings, {hot_deals} hot deals, {good_deals} good deals")
         return True
 
-# Setup logger
-setup_logger()
-log_github_actions_info()
+# Verdicts that are worth an alert, and the deal type shown in it
+DEAL_TYPES = {"HOT DEAL": "HOT", "GOOD DEAL": "GOOD"}
 
-async def main():
-    """Main function to run the scraping and analysis process."""
-    logger.info("🚀 Starting Deal Sniper Bot...")
-    
-    # Send startup message
-    await send_startup_message()
-    
-    # Define searches based on config
-    searches = [
-        {"name": "Gaming PC RTX 3080", "query": "rtx 3080", "price_end": PRICE_THRESHOLDS["rtx_3080"]},
-        {"name": "All Stationary Computers", "query": "stationär dator", "price_end": PRICE_THRESHOLDS["stationary_computers"]},
-        {"name": "Workstation Xeon", "query": "xeon workstation", "price_end": PRICE_THRESHOLDS["xeon_workstation"]}
-    ]
-    
-    # Initialize database
-    database.init_database()
+# Discord takes at most this many embeds in one webhook message
+MAX_DEALS_PER_BATCH = 10
+
+async def run_scan(searches):
+    """Scrape every search, judge the new listings and send alerts for the deals."""
+    # Three-stage pipeline: scrapers feed listing_queue, analysis workers judge listings and
+    # hand HOT/GOOD deals to deal_queue, and send workers post them. Each search's listings
+    # are judged while the other searches are still scraping.
+    listing_queue = asyncio.Queue(maxsize=LISTING_QUEUE_SIZE)
+    deal_queue = asyncio.Queue()
+    queued_ids = set()  # The same listing can turn up in several searches; queue it once
+    judged_rows = []  # Seen-rows for listings that got a verdict, written once judging is done
+    deal_counts = {"HOT": 0, "GOOD": 0}
     
-    all_new_listings = []
+    # Run the searches concurrently; they all hit Blocket, so only a few at a time
+    search_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
     
-    # Process each search
-    for search in searches:
-        new_listings = await scraper.scrape_blocket(search)
-        if new_listings:
-            all_new_listings.extend(new_listings)
+    async def scrape_worker(search):
+        try:
+            async with search_semaphore:
+                new_listings = await scraper.scrape_blocket(search)
+        except Exception as e:
+            logger.error(f"Scrape failed for {search['name']}: {e}")
+            return
         logger.info(f"Found {len(new_listings)} new listings on blocket for {search['name']}")
-    
-    logger.info(f"\n🚀 Total scan completed")
-    logger.info(f"📊 Total new listings found: {len(all_new_listings)}")
-    
-    hot_deals_count = 0
-    good_deals_count = 0
-    
-    # Process and evaluate all listings with AI
-    if all_new_listings:
-        logger.info(f"Evaluating {len(all_new_listings)} new listings with AI...")
         
-        for listing in all_new_listings:
+        fresh = [l for l in new_listings if l['id'] not in queued_ids]
+        queued_ids.update(l['id'] for l in fresh)
+        
+        # put() waits whenever the AI workers fall behind
+        for listing in fresh:
+            await listing_queue.put(listing)
+    
+    async def analysis_worker():
+        while (listing := await listing_queue.get()) is not None:
             try:
-                # AI analyzes each listing using real-time data and component prices
                 ai_verdict = await analyze_listing(listing)
+                # Only listings that were actually judged are marked seen; failed calls come back next run
+                if not ai_verdict.get('failed'):
+                    judged_rows.append((listing['id'], listing['title'], listing['price'], listing['url'], listing['source']))
                 logger.info(f"AI Verdict for {listing['title']}: {ai_verdict['verdict']} | "
                            f"Profit SEK: {ai_verdict['estimated_profit']} | "
                            f"Profit %: {ai_verdict['profit_percentage']} | "
                            f"Reason: {ai_verdict['reason']} | Comparisons: {ai_verdict['comparison_count']}")
                 
                 # Only send GOOD DEAL or HOT DEAL to Discord
-                if ai_verdict['verdict'] == "HOT DEAL":
-                    hot_deals_count += 1
-                    await send_deal_alert(listing, ai_verdict, "HOT")
-                    await asyncio.sleep(2)  # Delay to avoid rate limiting
-                elif ai_verdict['verdict'] == "GOOD DEAL":
-                    good_deals_count += 1
-                    await send_deal_alert(listing, ai_verdict, "GOOD")
-                    await asyncio.sleep(2)  # Delay to avoid rate limiting
+                deal_type = DEAL_TYPES.get(ai_verdict['verdict'])
+                if deal_type:
+                    deal_counts[deal_type] += 1
+                    if DISCORD_WEBHOOK_URL:
+                        await deal_queue.put((listing, ai_verdict, deal_type))
             except Exception as e:
                 logger.error(f"Failed to analyze listing {listing['title']}: {e}")
-    else:
-        logger.info("No new listings to analyze. Exiting.")
+    
+    async def send_worker():
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished and (deal := await deal_queue.get()) is not None:
+            # Deals trickle in at the AI's pace, so hold the first one for up to
+            # DISCORD_BATCH_WINDOW seconds to let the next few share its message
+            deals = [deal]
+            deadline = loop.time() + DISCORD_BATCH_WINDOW
+            while len(deals) < MAX_DEALS_PER_BATCH:
+                try:
+                    deal = await asyncio.wait_for(deal_queue.get(), max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if deal is None:
+                    finished = True
+                    break
+                deals.append(deal)
+            try:
+                await send_deal_alerts(deals)
+            except Exception as e:
+                logger.error(f"Failed to send {len(deals)} deal alert(s): {e}")
+    
+    # MAX_CONCURRENT_LLM analysis workers keep Ollama busy. One sender is enough: it batches
+    # up to ten deals per message and the webhook allows only 30 messages a minute anyway
+    analysis_workers = [asyncio.create_task(analysis_worker()) for _ in range(MAX_CONCURRENT_LLM)]
+    # Without a webhook there is nothing to send, so no deals are queued and no sender starts
+    send_workers = [asyncio.create_task(send_worker())] if DISCORD_WEBHOOK_URL else []
+    
+    # Each stage tells the next one it's finished with one None per worker
+    await asyncio.gather(*(scrape_worker(search) for search in searches))
+    for _ in analysis_workers:
+        await listing_queue.put(None)
+    
+    logger.info(f"\n🚀 Total scan completed")
+    logger.info(f"📊 Total new listings found: {len(queued_ids)}")
+    if not queued_ids:
+        logger.info("No new listings to analyze.")
+    
+    await asyncio.gather(*analysis_workers)
+    for _ in send_workers:
+        deal_queue.put_nowait(None)
+    # One batched seen-insert, in a thread while the last alerts go out
+    await asyncio.gather(asyncio.to_thread(database.mark_listings_seen, judged_rows), *send_workers)
     
     # Send summary message
-    await send_summary_message(len(all_new_listings), hot_deals_count, good_deals_count)
+    await send_summary_message(len(queued_ids), deal_counts["HOT"], deal_counts["GOOD"])
     
     # Cleanup old listings
     try:
         database.cleanup_old_listings(30)
+        database.cleanup_old_verdicts(VERDICT_TTL)
     except Exception as e:
         logger.warning(f"⚠️ Could not cleanup old listings: {e}")
 
+async def main():
+    """Main function to run the scraping and analysis process, once or every POLL_INTERVAL seconds."""
+    logger.info("🚀 Starting Deal Sniper Bot...")
+    log_github_actions_info()
+    
+    # Send startup message
+    await send_startup_message()
+    
+    # Define searches based on config
+    searches = [
+        {"name": "Gaming PC RTX 3080", "query": "rtx 3080", "category": "rtx_3080", "price_end": PRICE_THRESHOLDS["rtx_3080"]},
+        {"name": "All Stationary Computers", "query": "stationär dator", "category": "stationary_computers", "price_end": PRICE_THRESHOLDS["stationary_computers"]},
+        {"name": "Workstation Xeon", "query": "xeon workstation", "category": "xeon_workstation", "price_end": PRICE_THRESHOLDS["xeon_workstation"]}
+    ]
+    
+    # Initialize database
+    database.ensure_schema()
+    
+    # In poll mode SIGTERM/SIGINT let the current scan finish, then shut down cleanly
+    stop = asyncio.Event()
+    if POLL_INTERVAL:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+    
+    try:
+        while True:
+            try:
+                await run_scan(searches)
+            except Exception as e:
+                if not POLL_INTERVAL:
+                    raise
+                logger.error(f"Scan failed, will retry next interval: {e}")
+            if not POLL_INTERVAL:
+                break
+            
+            # The browser, HTTP session and database stay open between scans
+            logger.info(f"💤 Next scan in {POLL_INTERVAL}s")
+            try:
+                await asyncio.wait_for(stop.wait(), POLL_INTERVAL)
+                logger.info("🛑 Stop requested, shutting down")
+                break
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Release the browser and pooled HTTP connections, and checkpoint the WAL back into listings.db
+        await scraper.close_browser()
+        scraper.close_parse_pool()
+        await close_session()
+        database.close_database()
+
 if __name__ == "__main__":
-    # Delete old database to fix schema issues
-    import os
-    if os.path.exists("listings.db"):
-        os.remove("listings.db")
-        logger.info("🧹 Removed old database to fix schema issues")
+    # The seen/verdict history is what keeps repeat listings away from the AI, so only
+    # wipe it when explicitly asked to; ensure_schema() migrates older databases in place
+    if RESET_DATABASE:
+        database.reset_database()
+    
+    # Use the faster libuv-based event loop where available
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     
     asyncio.run(main())
@@ -3,33 +3,77 @@ import asyncio
 import os
 import re
 import random
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
 
 from playwright.async_api import async_playwright
 from playwright_stealth import stealth_async
 from bs4 import BeautifulSoup
+import soupsieve
+import aiohttp
 
 import database
 from config import (
     ENABLE_SCREENSHOTS,
+    HTTP_FAST_PATH,
+    MAX_CONCURRENT_PAGES,
+    MAX_CONCURRENT_SEARCHES,
     MAX_PAGES_TO_SCRAPE,
+    PAGE_JITTER_MS,
     REQUEST_DELAY,
 )
+from http_session import get_session
 from logger import log_detection, log_detection_sync, logger
 
+# Compiled once instead of per listing
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_LISTING_ID_RE = re.compile(r"/(\d+)$")
+# One case-insensitive scan of the page each, instead of lowercasing it per phrase
+_ERROR_PAGE_RE = re.compile(r"something went wrong|try again", re.IGNORECASE)
+_NO_RESULTS_RE = re.compile(r"inga resultat|inga annonser hittades", re.IGNORECASE)
+
+# How long (ms) to wait for the consent dialog to close after accepting it
+CONSENT_CLOSE_TIMEOUT = 5000
+
+# Blocket's results list and the listing cards inside it
+RESULTS_SELECTOR = 'div[data-cy="search-results"]'
+LISTING_SELECTOR = 'div.styled__Wrapper-sc-1kpvi4z-0.iQpUlz'
+
+# Selectors for the parts of a listing card, compiled once per process rather than looked
+# up in soupsieve's cache on every select() call
+_LISTING_SEL = soupsieve.compile(LISTING_SELECTOR)
+_TITLE_LINK_SEL = soupsieve.compile('h2 a.Link-sc-6wulv7-0')
+_TITLE_SEL = soupsieve.compile('span.styled__SubjectContainer-sc-1kpvi4z-9')
+_PRICE_SEL = soupsieve.compile('div.Price__StyledPrice-sc-1v2maoc-1')
+_LOCATION_SEL = soupsieve.compile('p.styled__TopInfoWrapper-sc-1kpvi4z-22 a:nth-child(3)')
+
+# How long (ms) to wait for lazy-loaded listings after scrolling, or for the network to
+# settle when the results list never showed up
+LISTINGS_LOAD_TIMEOUT = 6000
+NETWORK_IDLE_TIMEOUT = 5000
+
+
+async def _wait_for_consent_closed(accept_button):
+    try:
+        await accept_button.wait_for(state="hidden", timeout=CONSENT_CLOSE_TIMEOUT)
+    except Exception:
+        logger.warning("Consent dialog still visible after accepting. Continuing.")
+
 
 async def handle_cookie_consent(page):
     """Robustly handle cookie consent: try click, then force remove via JS if needed."""
     try:
         logger.info("Handling cookie consent...")
-        await page.wait_for_timeout(5000)
 
+        # The visible-wait below already covers the dialog's render time, and after a click
+        # we wait for the dialog to go away instead of sleeping a fixed time
+        accept_button = page.locator('button:has-text("Godkänn alla")')
         try:
-            accept_button = page.locator('button:has-text("Godkänn alla")')
             await accept_button.wait_for(state="visible", timeout=15000)
             await accept_button.click()
             logger.info("✅ Clicked 'Godkänn alla' button!")
-            await page.wait_for_timeout(3000)
+            await _wait_for_consent_closed(accept_button)
             return
         except Exception:
             logger.warning("Standard click failed. Trying JS injection.")
@@ -47,7 +91,7 @@ async def handle_cookie_consent(page):
 
         if clicked:
             logger.info("✅ JS clicked 'Godkänn alla'!")
-            await page.wait_for_timeout(3000)
+            await _wait_for_consent_closed(accept_button)
             return
 
         removed = await page.evaluate('''() => {
@@ -68,144 +112,379 @@ async def handle_cookie_consent(page):
         logger.error(f"Cookie handling error: {e}. Continuing.")
 
 
-async def scrape_blocket(search: Dict) -> List[Dict]:
-    """Scrape listings using BS4 after simulating human interaction."""
-    all_listings = []
-    browser = None
+# Only the HTML is parsed, so don't download what the page merely displays
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+
+# Ad and analytics hosts (and their subdomains) whose scripts never affect the listings
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "adnxs.com",
+    "criteo.com",
+    "cxense.com",
+)
+_BLOCKED_HOST_RE = re.compile(r"(?:^|\.)(?:" + "|".join(re.escape(host) for host in BLOCKED_HOSTS) + r")$")
+
+
+async def _block_heavy_resources(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or _BLOCKED_HOST_RE.search(urlsplit(request.url).hostname or ""):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+# One Chromium for the whole run (kept warm between scans in poll mode); each search gets
+# its own context (and proxy) in it
+_playwright = None
+_browser_task = None
+
+# /dev/shm is tiny in containers and CI runners, and searches run side by side in one
+# browser, so don't let Chromium throttle the pages that aren't in front
+BROWSER_LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-remote-fonts",
+]
+
+
+async def _launch_browser():
+    global _playwright
+    _playwright = await async_playwright().start()
+    try:
+        return await _playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+    except Exception:
+        # Don't leave the driver running; the next get_browser() starts a fresh one
+        await _playwright.stop()
+        _playwright = None
+        raise
+
+
+async def get_browser():
+    """Return the shared browser, launching it on first use (concurrent callers share the launch)."""
+    global _browser_task
+    if _browser_task is None:
+        _browser_task = asyncio.ensure_future(_launch_browser())
+    try:
+        browser = await _browser_task
+    except Exception:
+        _browser_task = None
+        raise
+    if not browser.is_connected():
+        # Crashed since the last scan; start a fresh one
+        logger.warning("Shared browser disconnected, relaunching")
+        await close_browser()
+        return await get_browser()
+    return browser
+
+
+async def close_browser():
+    """Close the shared browser and Playwright driver, if they were started."""
+    global _browser_task, _playwright
+    if _browser_task is not None:
+        try:
+            browser = await _browser_task
+            await browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+        _browser_task = None
+    if _playwright is not None:
+        await _playwright.stop()
+        _playwright = None
+
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+]
+ACCEPT_LANGUAGE = "sv-SE,sv;q=0.9,en;q=0.8"
+
+# Plain GETs for the HTTP fast path; a slow answer just means falling back to the browser
+HTTP_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=20)
+
+
+def _search_url(search: Dict, page_num: int) -> str:
+    return f"https://www.blocket.se/annonser/hela_sverige?q={search['query']}&price_end={search['price_end']}&page={page_num}"
+
+
+def _is_error_page(content: str) -> bool:
+    return _ERROR_PAGE_RE.search(content) is not None
+
+
+def _is_no_results_page(content: str) -> bool:
+    return _NO_RESULTS_RE.search(content) is not None
+
+
+async def _fetch_page_http(url: str, proxy: Optional[str]) -> Optional[str]:
+    """GET a results page without a browser; None if it didn't come back as a normal page."""
+    headers = {
+        "User-Agent": random.choice(USER_AGENTS),
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": ACCEPT_LANGUAGE,
+    }
+    try:
+        session = await get_session()
+        async with session.get(url, headers=headers, proxy=proxy, timeout=HTTP_FETCH_TIMEOUT) as response:
+            if response.status != 200:
+                logger.info(f"HTTP fetch got status {response.status} for {url}")
+                return None
+            return await response.text()
+    except Exception as e:
+        logger.info(f"HTTP fetch failed for {url}: {e}")
+        return None
+
+
+async def _extract_later_pages(contents: List[Optional[str]], search: Dict) -> List[Dict]:
+    """Parse pages 2..N in order, stopping at the first failed, error or no-results page."""
+    listings = []
+    for content in contents:
+        if content is None or _is_error_page(content):
+            break
+        listings.extend(await extract_listings(content, search))
+        if _is_no_results_page(content):
+            logger.info("No results detected.")
+            break
+    return listings
+
+
+async def _scrape_blocket_http(search: Dict, max_pages: int, proxy: Optional[str]) -> Optional[List[Dict]]:
+    """Scrape the server-rendered results pages over plain HTTP; None if the browser is needed."""
+    search_url = _search_url(search, 1)
+    logger.info(f"📄 Page 1 (HTTP): {search_url}")
+
+    content = await _fetch_page_http(search_url, proxy)
+    if content is None or _is_error_page(content):
+        # Blocked or challenged: hand the whole search to the browser
+        return None
+
+    parsed = await _parse_off_loop(content, search)
+    no_results = _is_no_results_page(content)
+    if not parsed and not no_results:
+        # Nothing in the markup we know how to read, so the page probably needs JS
+        return None
+    all_listings = _drop_seen(parsed)
+    if no_results:
+        logger.info("No results detected.")
+        return all_listings
+    if max_pages == 1:
+        return all_listings
+
+    # Page 1 was usable, so fetch the rest side by side
+    await asyncio.sleep(REQUEST_DELAY)
+    page_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+
+    async def fetch_page(page_num):
+        async with page_semaphore:
+            search_url = _search_url(search, page_num)
+            logger.info(f"📄 Page {page_num} (HTTP): {search_url}")
+            return await _fetch_page_http(search_url, proxy)
+
+    contents = await asyncio.gather(*(fetch_page(page_num) for page_num in range(2, max_pages + 1)))
+    all_listings.extend(await _extract_later_pages(contents, search))
+    return all_listings
+
+
+async def scrape_blocket(search: Dict, max_pages: int = MAX_PAGES_TO_SCRAPE) -> List[Dict]:
+    """Scrape up to max_pages result pages using BS4, over plain HTTP when Blocket allows it."""
     proxy_list = [p.strip() for p in os.getenv('PROXY_LIST', '').split(',') if p.strip()]
+    proxy = random.choice(proxy_list) if proxy_list else None
+
+    if HTTP_FAST_PATH:
+        logger.info(f"\n⚡ Scanning blocket for {search['name']} over HTTP (proxy: {bool(proxy)})")
+        listings = await _scrape_blocket_http(search, max_pages, proxy)
+        if listings is not None:
+            return listings
+        logger.warning(f"HTTP fast path unusable for {search['name']}, falling back to the browser")
+
+    return await _scrape_blocket_browser(search, max_pages, proxy)
+
+
+async def _load_results_page(page, search_url: str, first: bool) -> str:
+    """Open a results page like a visitor would and return its HTML."""
+    await page.goto(search_url, wait_until="domcontentloaded")
+
+    if first:
+        await handle_cookie_consent(page)
 
+    # Wait for search results to load, then only as long as the listings take to render
+    # plus a short human-looking pause
     try:
-        async with async_playwright() as p:
-            launch_args = {}
-            if proxy_list:
-                proxy = random.choice(proxy_list)
-                launch_args['proxy'] = {'server': proxy}
-            browser = await p.chromium.launch(headless=True, **launch_args)
-            context = await browser.new_context(
-                user_agent=random.choice([
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-                    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
-                ]),
-                viewport={"width": 1920, "height": 1080},
-                ignore_https_errors=True,
-                bypass_csp=True,
-                locale="sv-SE",
-                extra_http_headers={"Accept-Language": "sv-SE,sv;q=0.9,en;q=0.8"},
-            )
-            page = await context.new_page()
-            await stealth_async(page)
+        await page.wait_for_selector(RESULTS_SELECTOR, state='visible', timeout=45000)
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            await page.wait_for_selector(LISTING_SELECTOR, state='attached', timeout=LISTINGS_LOAD_TIMEOUT)
+        except Exception:
+            logger.warning("No listing cards rendered after scrolling. Capturing content anyway.")
+        await page.wait_for_timeout(random.randint(0, PAGE_JITTER_MS))
+        await page.mouse.move(random.randint(0, 1920), random.randint(0, 1080))
+    except Exception as e:
+        logger.warning(f"Selector wait failed: {e}. Capturing content anyway.")
+        try:
+            await page.wait_for_load_state("networkidle", timeout=NETWORK_IDLE_TIMEOUT)
+        except Exception:
+            pass
+
+    return await page.content()
 
-            # No timeouts
+
+async def _load_later_page(context, search: Dict, page_num: int, page_semaphore: asyncio.Semaphore) -> Optional[str]:
+    """Load one of pages 2..N in its own tab; None if it failed or showed the error page."""
+    async with page_semaphore:
+        search_url = _search_url(search, page_num)
+        logger.info(f"📄 Page {page_num}: {search_url}")
+        page = await context.new_page()
+        try:
+            await stealth_async(page)
             page.set_default_timeout(0)
+            content = await _load_results_page(page, search_url, first=False)
+            if _is_error_page(content):
+                logger.error("Detected 'something went wrong, try again' message.")
+                await log_detection(page, "Error page detected", search_url)
+                return None
+            return content
+        except Exception as e:
+            logger.error(f"Page {page_num} error: {e}")
+            await log_detection(page, str(e), search_url)
+            return None
+        finally:
+            await page.close()
+
+
+async def _scrape_blocket_browser(search: Dict, max_pages: int, proxy: Optional[str]) -> List[Dict]:
+    """Scrape up to max_pages result pages using BS4 after simulating human interaction."""
+    all_listings = []
+    context = None
 
-            logger.info(f"\n⚡ Scanning blocket for {search['name']} (proxy: {bool(proxy_list)})")
-
-            for page_num in range(1, MAX_PAGES_TO_SCRAPE + 1):
-                search_url = f"https://www.blocket.se/annonser/hela_sverige?q={search['query']}&price_end={search['price_end']}&page={page_num}"
-                logger.info(f"📄 Page {page_num}: {search_url}")
-
-                try:
-                    await page.goto(search_url, wait_until="domcontentloaded")
-
-                    if page_num == 1:
-                        await handle_cookie_consent(page)
-
-                    # Wait for search results to load
-                    try:
-                        await page.wait_for_selector('div[data-cy="search-results"]', state='visible', timeout=45000)
-                        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                        await page.wait_for_timeout(random.randint(5000, 15000))
-                        await page.mouse.move(random.randint(0, 1920), random.randint(0, 1080))
-                    except Exception as e:
-                        logger.warning(f"Selector wait failed: {e}. Capturing content anyway.")
-                        await page.wait_for_timeout(10000)
-
-                    # Get page content and check for error messages
-                    content = await page.content()
-                    if "something went wrong" in content.lower() or "try again" in content.lower():
-                        logger.error("Detected 'something went wrong, try again' message.")
-                        await log_detection(page, "Error page detected", search_url)
-                        break
-
-                    listings = fallback_extract_listings(content, search)
-                    all_listings.extend(listings)
-
-                    if "inga resultat" in content.lower() or "inga annonser hittades" in content.lower():
-                        logger.info("No results detected.")
-                        break
-                    if not listings and page_num == 1:
-                        logger.warning("No listings extracted. Capturing screenshot and saving content.")
-                        if ENABLE_SCREENSHOTS:
-                            from datetime import datetime
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            screenshot_path = os.path.join("screenshots", f"debug_{timestamp}.png")
-                            await page.screenshot(path=screenshot_path, full_page=True)
-                            logger.info(f"Screenshot: {screenshot_path}")
-                        with open('debug_content.html', 'w', encoding='utf-8') as f:
-                            f.write(content)
-                        logger.info("Saved page content to debug_content.html")
-                        break
-
-                except Exception as e:
-                    logger.error(f"Page {page_num} error: {e}")
-                    await log_detection(page, str(e), search_url)
-                    break
-
-                if page_num < MAX_PAGES_TO_SCRAPE:
-                    await asyncio.sleep(REQUEST_DELAY)
+    try:
+        browser = await get_browser()
+        context_args = {}
+        if proxy:
+            context_args['proxy'] = {'server': proxy}
+        context = await browser.new_context(
+            **context_args,
+            user_agent=random.choice(USER_AGENTS),
+            viewport={"width": 1920, "height": 1080},
+            ignore_https_errors=True,
+            bypass_csp=True,
+            locale="sv-SE",
+            extra_http_headers={"Accept-Language": ACCEPT_LANGUAGE},
+        )
+        await context.route("**/*", _block_heavy_resources)
+        page = await context.new_page()
+        await stealth_async(page)
+
+        # No timeouts
+        page.set_default_timeout(0)
+
+        logger.info(f"\n⚡ Scanning blocket for {search['name']} (proxy: {bool(proxy)})")
+
+        # Page 1 goes first: it accepts the cookie dialog for the whole context and shows
+        # whether there is anything beyond it
+        search_url = _search_url(search, 1)
+        logger.info(f"📄 Page 1: {search_url}")
+
+        try:
+            content = await _load_results_page(page, search_url, first=True)
+            if _is_error_page(content):
+                logger.error("Detected 'something went wrong, try again' message.")
+                await log_detection(page, "Error page detected", search_url)
+                return all_listings
+
+            listings = await extract_listings(content, search)
+            all_listings.extend(listings)
+
+            if _is_no_results_page(content):
+                logger.info("No results detected.")
+                return all_listings
+            if not listings:
+                logger.warning("No listings extracted. Capturing screenshot and saving content.")
+                if ENABLE_SCREENSHOTS:
+                    from datetime import datetime
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    screenshot_path = os.path.join("screenshots", f"debug_{timestamp}.png")
+                    await page.screenshot(path=screenshot_path, full_page=True)
+                    logger.info(f"Screenshot: {screenshot_path}")
+                with open('debug_content.html', 'w', encoding='utf-8') as f:
+                    f.write(content)
+                logger.info("Saved page content to debug_content.html")
+                return all_listings
+
+        except Exception as e:
+            logger.error(f"Page 1 error: {e}")
+            await log_detection(page, str(e), search_url)
+            return all_listings
+
+        # The remaining pages load side by side, each in its own tab of this context
+        if max_pages > 1:
+            await asyncio.sleep(REQUEST_DELAY)
+            page_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+            contents = await asyncio.gather(*(
+                _load_later_page(context, search, page_num, page_semaphore)
+                for page_num in range(2, max_pages + 1)
+            ))
+            all_listings.extend(await _extract_later_pages(contents, search))
 
     except Exception as e:
         logger.error(f"Browser error: {e}")
         log_detection_sync(str(e), "N/A")
     finally:
-        if browser:
-            await browser.close()
+        if context:
+            await context.close()
 
     return all_listings
 
 
-def fallback_extract_listings(content: str, search: Dict) -> List[Dict]:
-    """Extract listings using flexible BS4 selectors based on visible content."""
+def parse_listings(content: str, search: Dict) -> List[Dict]:
+    """Extract listings using flexible BS4 selectors based on visible content (no database access)."""
     listings = []
+    page_ids = set()
     try:
         soup = BeautifulSoup(content, 'html.parser')
 
         # Target listing containers based on Blocket's structure
-        potential_listings = soup.select('div.styled__Wrapper-sc-1kpvi4z-0.iQpUlz')
+        potential_listings = _LISTING_SEL.select(soup)
 
         logger.debug(f"Found {len(potential_listings)} potential listing containers.")
 
         for item in potential_listings:
             try:
                 # Title and URL
-                title_link = item.select_one('h2 a.Link-sc-6wulv7-0')
+                title_link = _TITLE_LINK_SEL.select_one(item)
                 if not title_link:
                     continue
-                title = title_link.select_one('span.styled__SubjectContainer-sc-1kpvi4z-9').get_text(strip=True)
+                title = _TITLE_SEL.select_one(title_link).get_text(strip=True)
                 url = f"https://www.blocket.se{title_link['href']}"
                 logger.debug(f"Extracted URL: {url}")
 
                 # Price
-                price_tag = item.select_one('div.Price__StyledPrice-sc-1v2maoc-1')
-                price_text = price_tag.get_text(strip=True) if price_tag else "0"
-                price = int(re.sub(r'[^\d]', '', price_text.replace(' ', ''))) if price_text and price_text.strip() else 0
+                price_tag = _PRICE_SEL.select_one(item)
+                price_text = price_tag.get_text(strip=True) if price_tag else ""
+                price_digits = _NON_DIGIT_RE.sub('', price_text)  # Also drops spaces, NBSPs and "kr"
+                price = int(price_digits) if price_digits else 0
                 logger.debug(f"Extracted price: {price_text} -> {price}")
                 if price == 0:
                     logger.warning(f"Invalid or missing price for listing: {title}")
                     continue
 
                 # Location
-                location_tag = item.select_one('p.styled__TopInfoWrapper-sc-1kpvi4z-22 a:nth-child(3)')
+                location_tag = _LOCATION_SEL.select_one(item)
                 location = location_tag.get_text(strip=True) if location_tag else "No location"
                 logger.debug(f"Extracted location: {location}")
 
                 # ID from URL (updated regex to match /annons/.../ID)
-                listing_id_match = re.search(r"/(\d+)$", url)
+                listing_id_match = _LISTING_ID_RE.search(url)
                 listing_id = listing_id_match.group(1) if listing_id_match else None
                 logger.debug(f"Extracted listing_id: {listing_id}")
 
-                if listing_id and not database.is_listing_seen(listing_id) and price <= search.get('price_end', float('inf')):
+                if listing_id and listing_id not in page_ids and price <= search.get('price_end', float('inf')):
                     listing = {
                         "id": listing_id,
                         "title": title,
@@ -215,24 +494,53 @@ def fallback_extract_listings(content: str, search: Dict) -> List[Dict]:
                         "source": "blocket",
                         "site": "blocket",
                         "query": search["name"],
+                        "category": search.get("category"),
                     }
                     listings.append(listing)
-                    database.mark_listing_seen(
-                        listing["id"],
-                        listing["title"],
-                        listing["price"],
-                        listing["url"],
-                        listing["source"],
-                    )
+                    page_ids.add(listing_id)
                     logger.debug(f"Added listing: {listing}")
 
             except Exception as e:
                 logger.error(f"Listing extraction error: {e}")
                 continue
 
-        logger.info(f"Extracted {len(listings)} listings via BS4.")
-
     except Exception as e:
         logger.error(f"BS4 extraction failed: {e}")
 
     return listings
+
+
+def _drop_seen(listings: List[Dict]) -> List[Dict]:
+    """Drop already-processed listings with one bulk lookup for the whole page."""
+    unseen = set(database.filter_unseen([listing["id"] for listing in listings]))
+    listings = [listing for listing in listings if listing["id"] in unseen]
+    logger.info(f"Extracted {len(listings)} listings via BS4.")
+    return listings
+
+
+# BeautifulSoup parsing is CPU-bound, so pages are parsed in worker processes while the
+# event loop keeps driving the browsers, Ollama and Discord. Up to one page per concurrent
+# page fetch can be waiting, but more workers than cores would only contend for CPU.
+PARSE_WORKERS = min(MAX_CONCURRENT_SEARCHES * MAX_CONCURRENT_PAGES, os.cpu_count() or 1)
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+async def _parse_off_loop(content: str, search: Dict) -> List[Dict]:
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_parse_pool, parse_listings, content, search)
+
+
+async def extract_listings(content: str, search: Dict) -> List[Dict]:
+    """Parse a results page off the event loop and keep only listings that haven't been processed yet."""
+    return _drop_seen(await _parse_off_loop(content, search))
+
+
+def close_parse_pool():
+    """Shut down the parsing worker processes, if they were started."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown()
+        _parse_pool = None